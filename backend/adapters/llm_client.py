@@ -2,17 +2,36 @@ from __future__ import annotations
 
 import json
 import os
-from typing import Any, Dict, List, Optional
-
-import httpx
+from typing import Any, Dict, List, NamedTuple, Optional
 
+from core.explain import explain
 from domain.models import ExplainRequest, ExplainResponse
 
 
-def generate_explanation(request: ExplainRequest) -> ExplainResponse:
+class ExplainOutcome(NamedTuple):
+    response: ExplainResponse
+    from_llm: bool
+    tokens: int
+
+
+def generate_explanation(request: ExplainRequest) -> ExplainOutcome:
+    """返回解释、是否由 LLM 生成以及本次消耗的 LLM token 数。
+
+    未配置或调用、解析失败时使用确定性解释。函数内会阻塞等待 LLM，异步调用方应放到线程池执行。
+    """
+    charged: List[int] = []
+    response = _generate_with_llm(request, charged)
+    if response is None:
+        return ExplainOutcome(_fallback_explanation(request), False, sum(charged))
+    return ExplainOutcome(response, True, sum(charged))
+
+
+def _generate_with_llm(
+    request: ExplainRequest, charged: List[int]
+) -> Optional[ExplainResponse]:
     config = _load_config()
     if config is None:
-        return _fallback_explanation(request)
+        return None
 
     system_prompt = _build_system_prompt()
     context = _build_context(request)
@@ -24,6 +43,9 @@ def generate_explanation(request: ExplainRequest) -> ExplainResponse:
     if request.messages:
         messages.extend([message.model_dump() for message in request.messages])
 
+    if _structured_output_enabled():
+        return _generate_structured(request, config, messages, charged)
+
     payload = {
         "model": config["model"],
         "messages": messages,
@@ -31,6 +53,8 @@ def generate_explanation(request: ExplainRequest) -> ExplainResponse:
     }
 
     try:
+        import httpx
+
         with httpx.Client(timeout=20.0) as client:
             response = client.post(
                 f"{config['base_url'].rstrip('/')}/chat/completions",
@@ -39,21 +63,102 @@ def generate_explanation(request: ExplainRequest) -> ExplainResponse:
             )
             response.raise_for_status()
             data = response.json()
-    except Exception:
-        return _fallback_explanation(request)
+    except Exception as exc:
+        if _was_sent(exc):
+            _report_usage(charged, None, messages, None)
+        return None
 
     content = _extract_content(data)
+    _report_usage(charged, data, messages, content)
     if content is None:
-        return _fallback_explanation(request)
+        return None
 
     parsed = _parse_json(content)
     if parsed is None:
-        return _fallback_explanation(request)
+        return None
 
     try:
         return ExplainResponse.model_validate(parsed)
     except Exception:
-        return _fallback_explanation(request)
+        return None
+
+
+def _generate_structured(
+    request: ExplainRequest,
+    config: Dict[str, str],
+    messages: List[Dict[str, str]],
+    charged: List[int],
+) -> Optional[ExplainResponse]:
+    import httpx
+
+    from adapters.structured_output import (
+        ExplainFieldCollector,
+        build_repair_prompt,
+        iter_sse_content,
+        response_format,
+    )
+
+    payload = {
+        "model": config["model"],
+        "messages": messages,
+        "temperature": 0.3,
+        "response_format": response_format(),
+        "stream": True,
+        "stream_options": {"include_usage": True},
+    }
+    url = f"{config['base_url'].rstrip('/')}/chat/completions"
+    headers = {"Authorization": f"Bearer {config['api_key']}"}
+
+    collector = ExplainFieldCollector()
+    usage: Dict[str, Any] = {}
+    streamed: List[str] = []
+    stream_error: Optional[Exception] = None
+    with httpx.Client(timeout=20.0) as client:
+        try:
+            with client.stream("POST", url, headers=headers, json=payload) as response:
+                response.raise_for_status()
+                for chunk in iter_sse_content(response.iter_lines(), usage):
+                    streamed.append(chunk)
+                    collector.feed(chunk)
+        except httpx.HTTPError as exc:
+            # 流中途断开时保留已通过校验的字段，交给下面的补全步骤
+            stream_error = exc
+        finally:
+            # 已发出的请求即使中途失败也会产生费用，按已收到的内容估算计入预算
+            if _was_sent(stream_error):
+                _report_usage(charged, usage, messages, "".join(streamed))
+
+        missing = collector.missing()
+        # 部分字段有效时只补全缺失字段，避免整段重新生成
+        if missing and collector.valid:
+            repair_payload = {
+                "model": config["model"],
+                "messages": messages
+                + [{"role": "user", "content": build_repair_prompt(collector.valid, missing)}],
+                "temperature": 0.3,
+                "response_format": response_format(missing),
+            }
+            try:
+                response = client.post(url, headers=headers, json=repair_payload)
+                response.raise_for_status()
+                data = response.json()
+            except Exception as exc:
+                if _was_sent(exc):
+                    _report_usage(charged, None, repair_payload["messages"], None)
+                return None
+            content = _extract_content(data)
+            _report_usage(charged, data, repair_payload["messages"], content)
+            if content is not None:
+                collector.feed_repair(content)
+
+    if collector.missing():
+        return None
+    return ExplainResponse(**collector.valid)
+
+
+def preload() -> None:
+    # httpx 导入较重，非启动优化模式下在启动时预热，避免首次 /explain 承担这部分耗时
+    import httpx  # noqa: F401
 
 
 def _load_config() -> Optional[Dict[str, str]]:
@@ -65,6 +170,35 @@ def _load_config() -> Optional[Dict[str, str]]:
     return {"api_key": api_key, "base_url": base_url, "model": model}
 
 
+def _was_sent(exc: Optional[BaseException]) -> bool:
+    """请求是否已到达模型服务：连接失败或服务端拒绝（非 2xx）时不计费。"""
+    if exc is None:
+        return True
+    import httpx
+
+    return not isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout, httpx.HTTPStatusError))
+
+
+def _report_usage(
+    charged: List[int],
+    data: Any,
+    messages: List[Dict[str, str]],
+    content: Optional[str],
+) -> None:
+    # data 是服务端返回的 JSON，不保证是 dict
+    usage = data.get("usage") if isinstance(data, dict) else None
+    tokens = usage.get("total_tokens") if isinstance(usage, dict) else None
+    if not isinstance(tokens, int):
+        # 服务端未返回 usage 时按字符数粗略估算（中文约 1~2 字符/token）
+        chars = sum(len(message.get("content") or "") for message in messages) + len(content or "")
+        tokens = chars // 2 + 1
+    charged.append(tokens)
+
+
+def _structured_output_enabled() -> bool:
+    return os.getenv("LLM_STRUCTURED_OUTPUT", "").strip().lower() in {"1", "true", "yes", "on"}
+
+
 def _build_system_prompt() -> str:
     return (
         "你是一个理性的决策解释助手。"
@@ -111,40 +245,4 @@ def _parse_json(content: str) -> Optional[Dict[str, Any]]:
 
 
 def _fallback_explanation(request: ExplainRequest) -> ExplainResponse:
-    decision = request.decision
-    per_option = decision.score_breakdown.per_option
-    best = per_option[0]
-    best_contrib = best.contributions
-
-    sorted_contribs = sorted(best_contrib.items(), key=lambda item: item[1], reverse=True)
-    top_dims = [f"{dim}({value})" for dim, value in sorted_contribs[:2]]
-    gap_text = ""
-    if len(per_option) > 1:
-        gap = round(per_option[0].score - per_option[1].score, 2)
-        gap_text = f"领先第二名约 {gap} 分。"
-
-    top_dims_text = "、".join(top_dims)
-
-    explanation = (
-        f"综合权重与评分，{best.option} 得分最高（{best.score}）。"
-        f"主要贡献来自 {top_dims_text}。{gap_text}"
-    )
-
-    highlights = [
-        f"最佳选项：{best.option}（{best.score}）",
-        f"主要驱动维度：{top_dims_text}",
-    ]
-
-    if request.assumptions:
-        highlights.append("存在默认补全的评分，已作为假设纳入计算。")
-
-    followups = [
-        "若你补充更准确的评分，结果会更稳健。",
-        "是否需要针对某个维度进行敏感性分析？",
-    ]
-
-    return ExplainResponse(
-        explanation=explanation,
-        highlights=highlights,
-        followups=followups,
-    )
+    return explain(request)
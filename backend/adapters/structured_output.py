@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+from domain.models import ExplainResponse
+
+
+EXPLAIN_FIELDS: Tuple[str, ...] = tuple(ExplainResponse.model_fields)
+
+# 由 ExplainResponse 派生的 JSON Schema 与逐字段校验器，模块加载时构建一次
+_EXPLAIN_SCHEMA: Dict[str, Any] = ExplainResponse.model_json_schema()
+_FIELD_ADAPTERS: Dict[str, TypeAdapter] = {
+    name: TypeAdapter(field.annotation) for name, field in ExplainResponse.model_fields.items()
+}
+
+
+def response_format(fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """OpenAI 兼容的 json_schema response_format；传入 fields 时只约束这些字段。"""
+    schema = _EXPLAIN_SCHEMA
+    name = "explain_response"
+    if fields is not None:
+        schema = {
+            "type": "object",
+            "properties": {key: _EXPLAIN_SCHEMA["properties"][key] for key in fields},
+            "required": list(fields),
+            "additionalProperties": False,
+        }
+        name = "explain_response_repair"
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": name, "schema": schema, "strict": True},
+    }
+
+
+def iter_sse_content(
+    lines: Iterable[str], usage: Optional[Dict[str, Any]] = None
+) -> Iterator[str]:
+    """从 chat/completions 的 SSE 流中逐段取出 delta.content；若传入 usage，顺带记录用量。"""
+    for line in lines:
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        try:
+            event = json.loads(data)
+            if usage is not None and event.get("usage"):
+                usage["usage"] = event["usage"]
+            content = event["choices"][0]["delta"].get("content")
+        except Exception:
+            continue
+        if content:
+            yield content
+
+
+class IncrementalObjectParser:
+    """增量解析顶层 JSON 对象：每当一个键值对完整到达时立即产出，无需等待整段输出。"""
+
+    def __init__(self) -> None:
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect_key = True
+        self._key_start: Optional[int] = None
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """返回本次新完成的 (key, raw_value) 列表；键无法解析的键值对会被跳过。"""
+        self._text += chunk
+        completed: List[Tuple[str, str]] = []
+        text = self._text
+        while self._pos < len(text) and not self.done:
+            ch = text[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expect_key and self._key_start is not None:
+                        self._key = _loads(text[self._key_start : self._pos + 1])
+                        self._key_start = None
+            elif self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+            elif ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expect_key:
+                    self._key_start = self._pos
+            elif ch in "{[":
+                self._depth += 1
+            elif ch == "]":
+                self._depth -= 1
+            elif ch == "}":
+                if self._depth == 1:
+                    self._finish_value(completed)
+                    self.done = True
+                self._depth -= 1
+            elif self._depth == 1 and ch == ":" and self._expect_key:
+                self._expect_key = False
+                self._value_start = self._pos + 1
+            elif self._depth == 1 and ch == ",":
+                self._finish_value(completed)
+            self._pos += 1
+        return completed
+
+    def _finish_value(self, completed: List[Tuple[str, str]]) -> None:
+        if self._value_start is not None and isinstance(self._key, str):
+            completed.append((self._key, self._text[self._value_start : self._pos].strip()))
+        self._expect_key = True
+        self._key = None
+        self._value_start = None
+
+
+class ExplainFieldCollector:
+    """逐字段校验增量解析出的 ExplainResponse 字段，保留已通过校验的部分。"""
+
+    def __init__(self) -> None:
+        self._parser = IncrementalObjectParser()
+        self.valid: Dict[str, Any] = {}
+
+    @property
+    def done(self) -> bool:
+        return self._parser.done
+
+    def feed(self, chunk: str) -> None:
+        for key, raw in self._parser.feed(chunk):
+            self._accept(key, raw)
+
+    def feed_repair(self, content: str) -> None:
+        """合并补全调用的输出，只接受仍缺失的字段。"""
+        for key, raw in IncrementalObjectParser().feed(content):
+            if key not in self.valid:
+                self._accept(key, raw)
+
+    def _accept(self, key: str, raw: str) -> None:
+        adapter = _FIELD_ADAPTERS.get(key)
+        if adapter is None:
+            return
+        try:
+            self.valid[key] = adapter.validate_json(raw)
+        except ValidationError:
+            return
+
+    def missing(self) -> List[str]:
+        return [name for name in EXPLAIN_FIELDS if name not in self.valid]
+
+
+def build_repair_prompt(valid: Dict[str, Any], missing: Sequence[str]) -> str:
+    return (
+        "以下字段已经生成（JSON）:\n"
+        + json.dumps(valid, ensure_ascii=False)
+        + "\n请只输出 JSON，且只包含缺失的字段："
+        + ", ".join(missing)
+        + "。内容需与已生成字段保持一致。"
+    )
+
+
+def _loads(raw: str) -> Optional[Any]:
+    try:
+        return json.loads(raw)
+    except Exception:
+        return None
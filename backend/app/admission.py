@@ -0,0 +1,329 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from core.explain import explain
+from domain.models import ExplainRequest, ExplainResponse
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+class TokenBucket:
+    """按客户端划分的令牌桶；状态只是 LRU 字典里的 [tokens, last_ts]。"""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 10000) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    def allow(self, client: str, now: float) -> Tuple[bool, float]:
+        """返回 (是否放行, 需要等待的秒数)。"""
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = [self.burst, now]
+            # 只淘汰最久未出现的客户端，它的桶通常早已回满
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens >= 1.0:
+            bucket[0] = tokens - 1.0
+            return True, 0.0
+        bucket[0] = tokens
+        return False, (1.0 - tokens) / self.rate if self.rate > 0 else 60.0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SharedUsageStore:
+    """多 worker 之间同步 LLM token 用量的本地 SQLite 存储。调用会阻塞，只应在线程池中执行。"""
+
+    def __init__(self, path: str) -> None:
+        self._conn = sqlite3.connect(path, timeout=1.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_usage ("
+            "client TEXT NOT NULL, window INTEGER NOT NULL, tokens INTEGER NOT NULL, "
+            "PRIMARY KEY (client, window))"
+        )
+
+    def sync(self, window: int, pending: Dict[str, int], limit: int) -> Set[str]:
+        """在一个事务里写入增量、清理过期窗口，并返回当前窗口内已超预算的客户端。"""
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany(
+                "INSERT INTO llm_usage (client, window, tokens) VALUES (?, ?, ?) "
+                "ON CONFLICT(client, window) DO UPDATE SET tokens = tokens + excluded.tokens",
+                [(client, window, tokens) for client, tokens in pending.items()],
+            )
+            self._conn.execute("DELETE FROM llm_usage WHERE window < ?", (window,))
+            rows = self._conn.execute(
+                "SELECT client FROM llm_usage WHERE window = ? AND tokens >= ?", (window, limit)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+
+class LlmBudget:
+    """按固定时间窗口统计每个客户端的 LLM token 用量。
+
+    本 worker 的用量保存在有上限的 LRU 字典里；配置共享存储时，增量按 sync_interval
+    批量写入，并取回所有 worker 合计已超预算的客户端集合。
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        window_seconds: float,
+        store: Optional[SharedUsageStore] = None,
+        sync_interval: float = 5.0,
+        max_clients: int = 10000,
+    ) -> None:
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.store = store
+        self.sync_interval = sync_interval
+        self.max_clients = max_clients
+        self._window = -1
+        self._used: "OrderedDict[str, int]" = OrderedDict()
+        self._pending: Dict[str, int] = {}
+        self._over: Set[str] = set()
+        self._last_sync = float("-inf")
+        self._syncing = False
+
+    def exhausted(self, client: str, now: float) -> bool:
+        if self.limit <= 0:
+            return False
+        self._roll(now)
+        return client in self._over or self._used.get(client, 0) >= self.limit
+
+    def charge(self, client: str, tokens: int, now: float) -> None:
+        self._roll(now)
+        self._used[client] = self._used.pop(client, 0) + tokens
+        if len(self._used) > self.max_clients:
+            self._used.popitem(last=False)
+        if self.store is not None:
+            self._pending[client] = self._pending.get(client, 0) + tokens
+
+    def sync_due(self, now: float) -> bool:
+        return (
+            self.store is not None
+            and not self._syncing
+            and now - self._last_sync >= self.sync_interval
+        )
+
+    def begin_sync(self, now: float) -> Tuple[int, Dict[str, int]]:
+        self._roll(now)
+        self._syncing = True
+        self._last_sync = now
+        pending, self._pending = self._pending, {}
+        return self._window, pending
+
+    def finish_sync(self, window: int, over: Optional[Set[str]], pending: Dict[str, int]) -> None:
+        self._syncing = False
+        if over is None:
+            # 同步失败：增量留到下一次再写
+            if window == self._window:
+                for client, tokens in pending.items():
+                    self._pending[client] = self._pending.get(client, 0) + tokens
+            return
+        if window == self._window:
+            self._over = over
+
+    def top(self, limit: int = 20) -> Dict[str, int]:
+        ranked = sorted(self._used.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return dict(ranked)
+
+    def _roll(self, now: float) -> None:
+        window = int(now // self.window_seconds)
+        if window != self._window:
+            # 进入新窗口：上一窗口未同步的增量已无意义，一并丢弃
+            self._window = window
+            self._used.clear()
+            self._pending.clear()
+            self._over = set()
+
+
+class ResponseCache:
+    """最近 LLM 解释结果的 LRU 缓存，超预算时优先复用。"""
+
+    def __init__(self, max_size: int = 1024) -> None:
+        self.max_size = max_size
+        self._items: "OrderedDict[str, ExplainResponse]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[ExplainResponse]:
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: ExplainResponse) -> None:
+        self._items[key] = value
+        self._items.move_to_end(key)
+        if len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class ClientIdentity:
+    """决定按什么区分客户端：可信代理头 > 白名单内的 API Key > IP。
+
+    任意 X-API-Key 都可以随手伪造，只有白名单里的 Key 才能获得独立的限流与预算。
+    """
+
+    def __init__(self, api_keys: Iterable[str] = (), trusted_header: Optional[str] = None) -> None:
+        # 只保存摘要，避免在内存和诊断输出中出现明文
+        self._api_keys = {_digest(key) for key in api_keys if key}
+        self.trusted_header = trusted_header.lower() if trusted_header else None
+
+    def key(self, headers: Mapping[str, str], host: Optional[str]) -> str:
+        if self.trusted_header:
+            value = headers.get(self.trusted_header)
+            if value:
+                return "hdr:" + _digest(value)
+        api_key = headers.get("x-api-key")
+        if api_key:
+            digest = _digest(api_key)
+            if digest in self._api_keys:
+                return "key:" + digest
+        return "ip:" + (host or "unknown")
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:16]
+
+
+class Admission:
+    """/explain 的准入控制：限流、LLM 预算、缓存与计数器。在事件循环线程内调用，无需加锁。"""
+
+    def __init__(
+        self,
+        limiter: TokenBucket,
+        budget: LlmBudget,
+        cache: ResponseCache,
+        identity: Optional[ClientIdentity] = None,
+    ) -> None:
+        self.limiter = limiter
+        self.budget = budget
+        self.cache = cache
+        self.identity = identity or ClientIdentity()
+        self.counters: Dict[str, int] = {
+            "admitted": 0,
+            "rate_limited": 0,
+            "over_budget": 0,
+            "cache_hits": 0,
+            "fallback_served": 0,
+            "llm_tokens": 0,
+            "sync_errors": 0,
+        }
+        self._sync_task: Optional["asyncio.Future[None]"] = None
+
+    def client_key(self, headers: Mapping[str, str], host: Optional[str]) -> str:
+        return self.identity.key(headers, host)
+
+    def check_rate(self, client: str) -> Tuple[bool, float]:
+        allowed, retry_after = self.limiter.allow(client, time.monotonic())
+        self.counters["admitted" if allowed else "rate_limited"] += 1
+        return allowed, retry_after
+
+    def over_budget(self, client: str) -> bool:
+        exhausted = self.budget.exhausted(client, time.time())
+        if exhausted:
+            self.counters["over_budget"] += 1
+        return exhausted
+
+    def charge(self, client: str, tokens: int) -> None:
+        self.counters["llm_tokens"] += tokens
+        self.budget.charge(client, tokens, time.time())
+
+    def schedule_sync(self) -> None:
+        """到期时在线程池里与共享存储同步，不阻塞事件循环，也不让当前请求等待。"""
+        now = time.time()
+        if not self.budget.sync_due(now):
+            return
+        window, pending = self.budget.begin_sync(now)
+        self._sync_task = asyncio.ensure_future(self._sync(window, pending))
+
+    async def _sync(self, window: int, pending: Dict[str, int]) -> None:
+        store = self.budget.store
+        over: Optional[Set[str]] = None
+        try:
+            if store is not None:
+                over = await asyncio.to_thread(store.sync, window, pending, self.budget.limit)
+        except sqlite3.Error:
+            self.counters["sync_errors"] += 1
+        finally:
+            self.budget.finish_sync(window, over, pending)
+
+    def cached(self, key: str) -> Optional[ExplainResponse]:
+        response = self.cache.get(key)
+        if response is not None:
+            self.counters["cache_hits"] += 1
+        return response
+
+    def remember(self, key: str, response: ExplainResponse) -> None:
+        self.cache.put(key, response)
+
+    def note_fallback(self) -> None:
+        self.counters["fallback_served"] += 1
+
+    def fallback(self, request: ExplainRequest) -> ExplainResponse:
+        self.note_fallback()
+        return explain(request)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "counters": dict(self.counters),
+            "rate_limit": {
+                "rate_per_sec": self.limiter.rate,
+                "burst": self.limiter.burst,
+                "tracked_clients": len(self.limiter),
+            },
+            "llm_budget": {
+                "limit_tokens": self.budget.limit,
+                "window_seconds": self.budget.window_seconds,
+                "shared_store": self.budget.store is not None,
+                "top_clients": self.budget.top(),
+            },
+            "cache_size": len(self.cache),
+        }
+
+
+def cache_key(request: ExplainRequest) -> str:
+    return hashlib.sha1(request.model_dump_json().encode("utf-8")).hexdigest()
+
+
+def from_env() -> Admission:
+    store_path = os.getenv("CHOICEMATE_ADMISSION_DB")
+    return Admission(
+        limiter=TokenBucket(
+            rate=_env_float("CHOICEMATE_RATE_PER_SEC", 2.0),
+            burst=_env_float("CHOICEMATE_RATE_BURST", 20.0),
+        ),
+        budget=LlmBudget(
+            limit=int(_env_float("CHOICEMATE_LLM_TOKEN_BUDGET", 200000)),
+            window_seconds=_env_float("CHOICEMATE_LLM_BUDGET_WINDOW", 86400.0),
+            store=SharedUsageStore(store_path) if store_path else None,
+        ),
+        cache=ResponseCache(int(_env_float("CHOICEMATE_EXPLAIN_CACHE_SIZE", 1024))),
+        identity=ClientIdentity(
+            api_keys=[key.strip() for key in os.getenv("CHOICEMATE_API_KEYS", "").split(",")],
+            trusted_header=os.getenv("CHOICEMATE_TRUSTED_CLIENT_HEADER") or None,
+        ),
+    )
@@ -1,25 +1,45 @@
 from __future__ import annotations
-from fastapi.middleware.cors import CORSMiddleware
+
+import math
 from typing import List
 
-from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
-
-from adapters.llm_client import generate_explanation
-from core.decision import decide
-from core.questionnaire import next_step
-from domain.models import (
-    DecideRequest,
-    DecideResponse,
-    ExplainRequest,
-    ExplainResponse,
-    QuestionnaireNextRequest,
-    QuestionnaireNextResponse,
-)
+from app import startup
+
+with startup.timed("fastapi"):
+    from fastapi import FastAPI, HTTPException, Request
+    from fastapi.concurrency import run_in_threadpool
+    from fastapi.middleware.cors import CORSMiddleware
+
+with startup.timed("dotenv"):
+    from dotenv import load_dotenv
 
+#按依赖顺序导入，保证各分组只统计自身新增的导入耗时
+with startup.timed("domain.models"):
+    from domain.models import (
+        DecideRequest,
+        DecideResponse,
+        ExplainRequest,
+        ExplainResponse,
+        QuestionnaireNextRequest,
+        QuestionnaireNextResponse,
+    )
+
+with startup.timed("core"):
+    from core.decision import decide
+    from core.questionnaire import next_step
+
+with startup.timed("app.admission"):
+    from app import admission
 
 load_dotenv()
 
+#启动优化模式：LLM 适配器（及 httpx）推迟到第一次 /explain 时再导入
+if not startup.fast_start_enabled():
+    with startup.timed("adapters.llm_client"):
+        from adapters import llm_client
+
+        llm_client.preload()
+
 app = FastAPI(title="ChoiceMate API", version="0.1.0")
 
 app.add_middleware(
@@ -32,11 +52,24 @@ app.add_middleware(
     allow_methods=["*"],   # 包含 OPTIONS/POST/GET 等
     allow_headers=["*"],   # 包含 Content-Type 等
 )
+app.add_middleware(startup.FirstResponseTimer)
+
+gate = admission.from_env()
 
 @app.get("/healthz")
 async def healthz() -> dict:
     return {"ok": True}
 
+#启动耗时诊断接口
+@app.get("/diagnostics/startup")
+async def diagnostics_startup() -> dict:
+    return startup.report()
+
+#准入控制计数器，用于容量规划
+@app.get("/diagnostics/admission")
+async def diagnostics_admission() -> dict:
+    return gate.report()
+
 #核心对话接口
 @app.post("/questionnaire/next", response_model=QuestionnaireNextResponse)
 async def questionnaire_next(payload: QuestionnaireNextRequest) -> QuestionnaireNextResponse:
@@ -64,8 +97,38 @@ async def decide_endpoint(payload: DecideRequest) -> DecideResponse:
 
 #解释接口
 @app.post("/explain", response_model=ExplainResponse)
-async def explain_endpoint(payload: ExplainRequest) -> ExplainResponse:
-    return generate_explanation(payload)
+async def explain_endpoint(payload: ExplainRequest, request: Request) -> ExplainResponse:
+    client = gate.client_key(request.headers, request.client.host if request.client else None)
+    allowed, retry_after = gate.check_rate(client)
+    if not allowed:
+        raise HTTPException(
+            status_code=429,
+            detail="请求过于频繁，请稍后再试",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    gate.schedule_sync()
+    key = admission.cache_key(payload)
+    #超出 LLM 预算时不再调用模型，优先返回缓存，否则走确定性解释
+    if gate.over_budget(client):
+        cached = gate.cached(key)
+        if cached is not None:
+            return cached
+        return gate.fallback(payload)
+
+    from adapters.llm_client import generate_explanation
+
+    #LLM 调用会阻塞，放到线程池执行，避免拖住同一 worker 上的其他请求；
+    #计费与缓存仍回到事件循环线程中完成
+    outcome = await run_in_threadpool(generate_explanation, payload)
+    if outcome.tokens:
+        gate.charge(client, outcome.tokens)
+    #只缓存真正由 LLM 生成的结果，其余情况都计为 fallback
+    if outcome.from_llm:
+        gate.remember(key, outcome.response)
+    else:
+        gate.note_fallback()
+    return outcome.response
 
 
 def _clean_options(options: List[str]) -> List[str]:
@@ -77,3 +140,7 @@ def _clean_options(options: List[str]) -> List[str]:
         if value:
             cleaned.append(value)
     return cleaned
+
+
+#路由注册完成后才算就绪
+startup.mark_ready()
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# 计时起点：app.main 的第一条 import，近似进程冷启动时刻
+STARTED_AT = time.perf_counter()
+
+FAST_START_ENV = "CHOICEMATE_FAST_START"
+
+# 启动优化模式下推迟到首次使用时才导入的模块
+DEFERRED_MODULES: List[str] = ["adapters.llm_client", "httpx"]
+
+_import_ms: Dict[str, float] = {}
+_ready_ms: Optional[float] = None
+_first_response_ms: Optional[float] = None
+
+
+def fast_start_enabled() -> bool:
+    return os.getenv(FAST_START_ENV, "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+@contextmanager
+def timed(label: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _import_ms[label] = _import_ms.get(label, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def mark_ready() -> None:
+    global _ready_ms
+    _ready_ms = (time.perf_counter() - STARTED_AT) * 1000
+
+
+def report() -> Dict[str, Any]:
+    return {
+        "mode": "fast" if fast_start_enabled() else "eager",
+        "imports_ms": {label: round(value, 2) for label, value in _import_ms.items()},
+        "ready_ms": _round(_ready_ms),
+        "first_response_ms": _round(_first_response_ms),
+        # 启动优化模式下可延迟导入的模块当前是否已加载
+        "loaded": {name: name in sys.modules for name in DEFERRED_MODULES},
+    }
+
+
+class FirstResponseTimer:
+    """纯 ASGI 中间件：只记录第一次 HTTP 响应开始的时间，之后直接透传。"""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if _first_response_ms is not None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            global _first_response_ms
+            if message["type"] == "http.response.start" and _first_response_ms is None:
+                _first_response_ms = (time.perf_counter() - STARTED_AT) * 1000
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 2)
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from core.decision import rating_to_utility_scaled
+from domain.models import ExplainRequest, ExplainResponse, ScoreBreakdownOption
+
+
+DEFAULT_TONE = "clear"
+DEFAULT_LENGTH = "medium"
+
+# 各语气下的句子模板，占位符在 _explain 中统一填充
+_SENTENCES: Dict[str, Dict[str, str]] = {
+    "clear": {
+        "headline": "综合权重与评分，{best} 得分最高（{score}）。",
+        "drivers": "主要贡献来自 {top_dims}。",
+        "gap": "领先第二名约 {gap} 分。",
+        "lead": "与 {runner} 相比，差距主要体现在 {lead_dim}（+{lead_value}）。",
+        "defaults": "其中有 {default_count} 项默认补全的评分足以影响排序，建议补充。",
+    },
+    "friendly": {
+        "headline": "按你给出的权重和评分，{best} 目前领先（{score} 分）。",
+        "drivers": "它的优势主要在 {top_dims}。",
+        "gap": "比第二名多出约 {gap} 分。",
+        "lead": "和 {runner} 比，最拉开差距的是 {lead_dim}（+{lead_value}）。",
+        "defaults": "有 {default_count} 项评分是按默认值补上的，填上真实值后结论可能会变。",
+    },
+}
+
+# 不同篇幅包含哪些句子；缺少数据的句子（如只有一个选项时的 gap）会被跳过
+_LENGTH_SENTENCES: Dict[str, Tuple[str, ...]] = {
+    "short": ("headline", "gap"),
+    "medium": ("headline", "drivers", "gap"),
+    "long": ("headline", "drivers", "gap", "lead", "defaults"),
+}
+
+_HIGHLIGHTS: Dict[str, str] = {
+    "best": "最佳选项：{best}（{score}）",
+    "drivers": "主要驱动维度：{top_dims}",
+    "lead": "领先最多的维度：{lead_dim}（较 {runner} +{lead_value}）",
+    "default_cell": "默认补全影响排序：{option} 的 {dimension}",
+    "assumptions": "存在默认补全的评分，已作为假设纳入计算。",
+}
+
+_FOLLOWUPS: Dict[str, str] = {
+    "fill_defaults": "补充 {cells} 的真实评分后，结论会更可靠。",
+    "refine": "若你补充更准确的评分，结果会更稳健。",
+    "sensitivity": "是否需要针对 {lead_dim} 进行敏感性分析？",
+    "sensitivity_generic": "是否需要针对某个维度进行敏感性分析？",
+    "close_call": "前两名差距较小，是否要重新确认各维度的权重？",
+}
+
+# 每条句子需要的字段；字段缺失时跳过该句
+_REQUIRED_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "headline": ("best", "score"),
+    "drivers": ("top_dims",),
+    "gap": ("gap",),
+    "lead": ("runner", "lead_dim", "lead_value"),
+    "defaults": ("default_count",),
+}
+
+_Template = Tuple[Tuple[Callable[..., str], Tuple[str, ...]], ...]
+
+
+def _compile() -> Dict[Tuple[str, str], _Template]:
+    compiled: Dict[Tuple[str, str], _Template] = {}
+    for tone, sentences in _SENTENCES.items():
+        for length, keys in _LENGTH_SENTENCES.items():
+            compiled[(tone, length)] = tuple(
+                (sentences[key].format, _REQUIRED_FIELDS[key]) for key in keys
+            )
+    return compiled
+
+
+# 模块加载时编译一次，之后每次解释只做字典查找和格式化
+_COMPILED = _compile()
+_HIGHLIGHT_FORMATS = {key: value.format for key, value in _HIGHLIGHTS.items()}
+_FOLLOWUP_FORMATS = {key: value.format for key, value in _FOLLOWUPS.items()}
+
+
+def explain(request: ExplainRequest) -> ExplainResponse:
+    tone, length = _resolve_style(request)
+    return _explain(request, _COMPILED[(tone, length)])
+
+
+def explain_batch(requests: Iterable[ExplainRequest]) -> List[ExplainResponse]:
+    return [explain(request) for request in requests]
+
+
+def _resolve_style(request: ExplainRequest) -> Tuple[str, str]:
+    style = request.style
+    tone = style.tone if style and style.tone in _SENTENCES else DEFAULT_TONE
+    length = style.length if style and style.length in _LENGTH_SENTENCES else DEFAULT_LENGTH
+    return tone, length
+
+
+def _explain(request: ExplainRequest, template: _Template) -> ExplainResponse:
+    breakdown = request.decision.score_breakdown
+    per_option = breakdown.per_option
+    best = per_option[0]
+    runner = per_option[1] if len(per_option) > 1 else None
+
+    top_dims = sorted(best.contributions.items(), key=lambda item: item[1], reverse=True)[:2]
+    fields: Dict[str, object] = {"best": best.option, "score": best.score}
+    if top_dims:
+        fields["top_dims"] = "、".join(f"{dim}({value})" for dim, value in top_dims)
+
+    gap: Optional[float] = None
+    lead_dim: Optional[str] = None
+    if runner is not None:
+        gap = round(best.score - runner.score, 2)
+        fields["gap"] = gap
+        lead = _lead_dimension(best, runner)
+        if lead is not None:
+            lead_dim = lead[0]
+            fields["runner"] = runner.option
+            fields["lead_dim"] = lead_dim
+            fields["lead_value"] = lead[1]
+
+    mattered = _decisive_defaults(request, best, runner, gap)
+    if mattered:
+        fields["default_count"] = len(mattered)
+
+    explanation = "".join(
+        render(**fields) for render, required in template if all(key in fields for key in required)
+    )
+
+    highlights = [_HIGHLIGHT_FORMATS["best"](**fields)]
+    if top_dims:
+        highlights.append(_HIGHLIGHT_FORMATS["drivers"](**fields))
+    if lead_dim is not None:
+        highlights.append(_HIGHLIGHT_FORMATS["lead"](**fields))
+    for option, dimension in mattered:
+        highlights.append(_HIGHLIGHT_FORMATS["default_cell"](option=option, dimension=dimension))
+    if request.assumptions and not mattered:
+        highlights.append(_HIGHLIGHT_FORMATS["assumptions"]())
+
+    followups = []
+    if mattered:
+        cells = "、".join(f"{option} 的 {dimension}" for option, dimension in mattered)
+        followups.append(_FOLLOWUP_FORMATS["fill_defaults"](cells=cells))
+    else:
+        followups.append(_FOLLOWUP_FORMATS["refine"]())
+    if lead_dim is not None:
+        followups.append(_FOLLOWUP_FORMATS["sensitivity"](lead_dim=lead_dim))
+    else:
+        followups.append(_FOLLOWUP_FORMATS["sensitivity_generic"]())
+    if request.decision.confidence == "low":
+        followups.append(_FOLLOWUP_FORMATS["close_call"]())
+
+    return ExplainResponse(
+        explanation=explanation,
+        highlights=highlights,
+        followups=followups,
+    )
+
+
+def _lead_dimension(
+    best: ScoreBreakdownOption, runner: ScoreBreakdownOption
+) -> Optional[Tuple[str, float]]:
+    lead: Optional[Tuple[str, float]] = None
+    for dimension, value in best.contributions.items():
+        diff = value - runner.contributions.get(dimension, 0.0)
+        if lead is None or diff > lead[1]:
+            lead = (dimension, diff)
+    if lead is None:
+        return None
+    return lead[0], round(lead[1], 2)
+
+
+def _decisive_defaults(
+    request: ExplainRequest,
+    best: ScoreBreakdownOption,
+    runner: Optional[ScoreBreakdownOption],
+    gap: Optional[float],
+) -> List[Tuple[str, str]]:
+    # 只有前两名的默认补全评分，且其最大可能摆动不小于分差时，才可能改变结论
+    if runner is None or gap is None or not request.facts_completion:
+        return []
+    weights = request.decision.score_breakdown.weights
+    contenders = {best.option, runner.option}
+    mattered = []
+    for item in request.facts_completion:
+        if item.source != "default" or item.option not in contenders:
+            continue
+        # 真实评分可能落在 1~5 任意处，效用摆动上限取到两端的较大距离
+        utility = rating_to_utility_scaled(item.dimension, item.filled_value)
+        swing = max(utility, 100.0 - utility) * weights.get(item.dimension, 0.0)
+        if swing >= gap:
+            mattered.append((item.option, item.dimension))
+    return mattered
@@ -0,0 +1,67 @@
+import httpx
+import pytest
+
+from domain.models import ExplainRequest
+
+
+def _build_explain_request(style=None, facts_completion=None):
+    return ExplainRequest.model_validate(
+        {
+            "problem": "是否从大厂跳去创业公司",
+            "options": ["留在大厂", "加入创业公司"],
+            "facts": {
+                "weights": {"impact": 4, "cost": 2, "risk": 3, "reversibility": 1},
+                "option_ratings": {
+                    "留在大厂": {"impact": 4, "cost": 3, "risk": 2, "reversibility": 3},
+                    "加入创业公司": {"impact": 3, "cost": 2, "risk": 4, "reversibility": 2},
+                },
+            },
+            "decision": {
+                "best_option": "留在大厂",
+                "score_breakdown": {
+                    "scale": "0-100",
+                    "dimensions": ["impact", "cost", "risk", "reversibility"],
+                    "weights": {"impact": 0.4, "cost": 0.2, "risk": 0.3, "reversibility": 0.1},
+                    "per_option": [
+                        {
+                            "option": "留在大厂",
+                            "score": 62.5,
+                            "contributions": {"impact": 30, "cost": 10, "risk": 15, "reversibility": 7.5},
+                            "ratings": {"impact": 4, "cost": 3, "risk": 2, "reversibility": 3},
+                        },
+                        {
+                            "option": "加入创业公司",
+                            "score": 50.0,
+                            "contributions": {"impact": 22.5, "cost": 15, "risk": 7.5, "reversibility": 5},
+                            "ratings": {"impact": 3, "cost": 2, "risk": 4, "reversibility": 2},
+                        },
+                    ],
+                },
+                "assumptions": [],
+                "confidence": "medium",
+            },
+            "facts_completion": facts_completion or [],
+            "assumptions": ["假设"] if facts_completion else [],
+            "style": style,
+        }
+    )
+
+
+@pytest.fixture
+def explain_request():
+    return _build_explain_request
+
+
+@pytest.fixture
+def mock_llm(monkeypatch):
+    """配置 LLM_* 环境变量，并让 httpx.Client 把请求交给给定的 handler。"""
+    real_client = httpx.Client
+
+    def install(handler):
+        transport = httpx.MockTransport(handler)
+        monkeypatch.setattr(httpx, "Client", lambda **kwargs: real_client(transport=transport, **kwargs))
+        monkeypatch.setenv("LLM_API_KEY", "key")
+        monkeypatch.setenv("LLM_BASE_URL", "https://llm.test/v1")
+        monkeypatch.setenv("LLM_MODEL", "model")
+
+    return install
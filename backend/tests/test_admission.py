@@ -0,0 +1,124 @@
+import asyncio
+
+import httpx
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.admission import (
+    Admission,
+    ClientIdentity,
+    LlmBudget,
+    ResponseCache,
+    SharedUsageStore,
+    TokenBucket,
+    cache_key,
+)
+from domain.models import ExplainResponse
+
+
+def _gate(burst=2.0, limit=100, store=None):
+    return Admission(
+        limiter=TokenBucket(rate=0.001, burst=burst),
+        budget=LlmBudget(limit=limit, window_seconds=86400.0, store=store),
+        cache=ResponseCache(8),
+    )
+
+
+def test_rate_limit_returns_429(monkeypatch, explain_request):
+    monkeypatch.setattr(main, "gate", _gate(burst=2.0))
+    client = TestClient(main.app)
+    body = explain_request().model_dump(mode="json")
+
+    statuses = [client.post("/explain", json=body).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+
+    counters = client.get("/diagnostics/admission").json()["counters"]
+    assert counters["admitted"] == 2
+    assert counters["rate_limited"] == 1
+
+
+def test_over_budget_serves_cache_then_fallback(monkeypatch, explain_request):
+    gate = _gate(burst=10.0, limit=100)
+    monkeypatch.setattr(main, "gate", gate)
+    client = TestClient(main.app)
+    request = explain_request()
+    other = explain_request(style={"length": "short"})
+
+    gate.charge("ip:testclient", 150)
+    gate.remember(cache_key(request), ExplainResponse(explanation="cached", highlights=[], followups=[]))
+
+    assert client.post("/explain", json=request.model_dump(mode="json")).json()["explanation"] == "cached"
+    fallback = client.post("/explain", json=other.model_dump(mode="json")).json()
+    assert fallback["explanation"].startswith("综合权重与评分")
+    assert gate.counters["over_budget"] == 2
+    assert gate.counters["cache_hits"] == 1
+    assert gate.counters["fallback_served"] == 1
+
+
+def test_shared_store_syncs_budget_across_workers(tmp_path):
+    path = str(tmp_path / "admission.sqlite")
+    first = _gate(limit=100, store=SharedUsageStore(path))
+    second = _gate(limit=100, store=SharedUsageStore(path))
+    first.budget.sync_interval = second.budget.sync_interval = 0.0
+
+    async def run():
+        first.charge("key:a", 60)
+        second.charge("key:a", 50)
+        first.schedule_sync()
+        await first._sync_task
+        assert not second.over_budget("key:a")
+        second.schedule_sync()
+        await second._sync_task
+        first.schedule_sync()
+        await first._sync_task
+        assert first.over_budget("key:a")
+
+    asyncio.run(run())
+
+
+def test_token_bucket_evicts_least_recently_seen_client():
+    limiter = TokenBucket(rate=0.001, burst=1.0, max_clients=2)
+    assert limiter.allow("a", 0.0)[0]
+    assert limiter.allow("b", 0.0)[0]
+    assert not limiter.allow("a", 0.0)[0]
+    assert limiter.allow("c", 0.0)[0]
+    assert len(limiter) == 2
+    assert not limiter.allow("a", 0.0)[0]
+
+
+def test_unknown_api_keys_share_the_ip_bucket(monkeypatch, explain_request):
+    gate = _gate(burst=2.0)
+    gate.identity = ClientIdentity(api_keys=["trusted"])
+    monkeypatch.setattr(main, "gate", gate)
+    client = TestClient(main.app)
+    body = explain_request().model_dump(mode="json")
+
+    rotating = [
+        client.post("/explain", json=body, headers={"X-API-Key": f"k{i}"}).status_code for i in range(3)
+    ]
+    assert rotating == [200, 200, 429]
+    assert client.post("/explain", json=body, headers={"X-API-Key": "trusted"}).status_code == 200
+
+
+def test_non_object_llm_json_falls_back(monkeypatch, explain_request, mock_llm):
+    mock_llm(lambda request: httpx.Response(200, json=[1, 2]))
+    monkeypatch.setattr(main, "gate", _gate(burst=10.0))
+
+    response = TestClient(main.app).post("/explain", json=explain_request().model_dump(mode="json"))
+
+    assert response.status_code == 200
+    assert response.json()["explanation"].startswith("综合权重与评分")
+
+
+def test_failed_llm_output_is_counted_and_not_cached(monkeypatch, explain_request, mock_llm):
+    content = {"choices": [{"message": {"content": "not json"}}], "usage": {"total_tokens": 40}}
+    mock_llm(lambda request: httpx.Response(200, json=content))
+    gate = _gate(burst=10.0)
+    monkeypatch.setattr(main, "gate", gate)
+
+    response = TestClient(main.app).post("/explain", json=explain_request().model_dump(mode="json"))
+
+    assert response.json()["explanation"].startswith("综合权重与评分")
+    assert len(gate.cache) == 0
+    assert gate.counters["fallback_served"] == 1
+    assert gate.counters["llm_tokens"] == 40
@@ -0,0 +1,58 @@
+from core.explain import explain, explain_batch
+
+
+def test_explain_default_style(explain_request):
+    response = explain(explain_request())
+    assert response.explanation == (
+        "综合权重与评分，留在大厂 得分最高（62.5）。"
+        "主要贡献来自 impact(30.0)、risk(15.0)。领先第二名约 12.5 分。"
+    )
+    assert "领先最多的维度：impact（较 加入创业公司 +7.5）" in response.highlights
+
+
+def test_explain_style_variants_and_decisive_defaults(explain_request):
+    completion = [{"option": "留在大厂", "dimension": "risk", "filled_value": 3, "source": "default"}]
+    short = explain(explain_request(style={"tone": "clear", "length": "short"}))
+    long = explain(explain_request(style={"tone": "friendly", "length": "long"}, facts_completion=completion))
+
+    assert short.explanation == "综合权重与评分，留在大厂 得分最高（62.5）。领先第二名约 12.5 分。"
+    assert long.explanation.startswith("按你给出的权重和评分")
+    assert "默认补全影响排序：留在大厂 的 risk" in long.highlights
+    assert "留在大厂 的 risk" in long.followups[0]
+
+
+def test_decisive_defaults_use_filled_value_and_source(explain_request):
+    completion = [
+        {"option": "留在大厂", "dimension": "cost", "filled_value": 3, "source": "default"},
+        {"option": "加入创业公司", "dimension": "cost", "filled_value": 5, "source": "default"},
+        {"option": "留在大厂", "dimension": "risk", "filled_value": 3, "source": "user"},
+    ]
+    response = explain(explain_request(facts_completion=completion))
+
+    assert [item for item in response.highlights if item.startswith("默认补全影响排序")] == [
+        "默认补全影响排序：加入创业公司 的 cost"
+    ]
+
+
+def test_explain_without_contributions(explain_request):
+    request = explain_request(style={"length": "long"})
+    for option in request.decision.score_breakdown.per_option:
+        option.contributions = {}
+    response = explain(request)
+
+    assert response.explanation == "综合权重与评分，留在大厂 得分最高（62.5）。领先第二名约 12.5 分。"
+    assert response.highlights == ["最佳选项：留在大厂（62.5）"]
+    assert response.followups[-1] == "是否需要针对某个维度进行敏感性分析？"
+    assert "inf" not in "".join(response.highlights + response.followups)
+
+
+def test_explain_batch_matches_single(explain_request):
+    styles = [
+        None,
+        {"tone": "friendly", "length": "long"},
+        {"tone": "clear", "length": "short"},
+        {"tone": "unknown"},
+    ]
+    requests = [explain_request(style=style) for style in styles] * 3
+    responses = explain_batch(requests)
+    assert responses == [explain(request) for request in requests]
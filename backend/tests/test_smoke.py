@@ -10,6 +10,19 @@ def test_healthz():
     assert response.json() == {"ok": True}
 
 
+def test_diagnostics_startup():
+    client = TestClient(app)
+    client.get("/healthz")
+    response = client.get("/diagnostics/startup")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["mode"] in {"fast", "eager"}
+    assert "fastapi" in data["imports_ms"]
+    assert data["ready_ms"] is not None
+    assert data["first_response_ms"] is not None
+    assert set(data["loaded"]) == {"adapters.llm_client", "httpx"}
+
+
 def test_questionnaire_flow():
     client = TestClient(app)
 
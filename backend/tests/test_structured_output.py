@@ -0,0 +1,118 @@
+import json
+
+import httpx
+
+from adapters.llm_client import generate_explanation
+from adapters.structured_output import ExplainFieldCollector, IncrementalObjectParser
+from domain.models import Message
+
+
+def test_incremental_parser_emits_fields_as_they_complete():
+    parser = IncrementalObjectParser()
+    assert parser.feed('{"explanation": "a, {b}') == []
+    assert parser.feed('", "highlights": ["x"') == [("explanation", '"a, {b}"')]
+    assert parser.feed(', "y"], "followups": []}') == [
+        ("highlights", '["x", "y"]'),
+        ("followups", "[]"),
+    ]
+    assert parser.done
+
+
+def test_collector_keeps_valid_fields_only():
+    collector = ExplainFieldCollector()
+    collector.feed('{"explanation": "ok", "highlights": "not-a-list", "followups": ["q"')
+    assert collector.valid == {"explanation": "ok"}
+    assert collector.missing() == ["highlights", "followups"]
+
+
+def _sse(content):
+    chunks = [content[i : i + 7] for i in range(0, len(content), 7)]
+    lines = [
+        "data: " + json.dumps({"choices": [{"delta": {"content": chunk}}]}) for chunk in chunks
+    ]
+    return "\n\n".join(lines + ["data: [DONE]"]) + "\n\n"
+
+
+def test_structured_mode_repairs_only_missing_fields(monkeypatch, explain_request, mock_llm):
+    calls = []
+
+    def handler(request):
+        body = json.loads(request.content)
+        calls.append(body)
+        if body.get("stream"):
+            partial = '{"explanation": "留在大厂更合适", "highlights": ["impact"], "followups": [1'
+            return httpx.Response(200, text=_sse(partial), headers={"content-type": "text/event-stream"})
+        content = json.dumps({"followups": ["要补充评分吗？"]}, ensure_ascii=False)
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+    mock_llm(handler)
+    monkeypatch.setenv("LLM_STRUCTURED_OUTPUT", "1")
+
+    request = explain_request()
+    request.messages = [Message(role="user", content="我更看重长期成长")]
+    response, from_llm, _ = generate_explanation(request)
+
+    assert from_llm
+    assert response.explanation == "留在大厂更合适"
+    assert response.highlights == ["impact"]
+    assert response.followups == ["要补充评分吗？"]
+    assert len(calls) == 2
+    assert calls[0]["response_format"]["json_schema"]["name"] == "explain_response"
+    assert calls[1]["response_format"]["json_schema"]["schema"]["required"] == ["followups"]
+    assert calls[1]["messages"][:-1] == calls[0]["messages"]
+
+
+class _BrokenStream(httpx.SyncByteStream):
+    def __init__(self, body):
+        self._body = body
+
+    def __iter__(self):
+        yield self._body.encode("utf-8")
+        raise httpx.ReadTimeout("stream stalled")
+
+
+def test_structured_mode_repairs_after_stream_breaks(monkeypatch, explain_request, mock_llm):
+    calls = []
+
+    def handler(request):
+        body = json.loads(request.content)
+        calls.append(body)
+        if body.get("stream"):
+            partial = '{"explanation": "留在大厂更合适", "highlights": ["impact"], "follo'
+            return httpx.Response(
+                200,
+                stream=_BrokenStream(_sse(partial).replace("data: [DONE]", "")),
+                headers={"content-type": "text/event-stream"},
+            )
+        content = json.dumps({"followups": ["要补充评分吗？"]}, ensure_ascii=False)
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+    mock_llm(handler)
+    monkeypatch.setenv("LLM_STRUCTURED_OUTPUT", "1")
+
+    response, from_llm, tokens = generate_explanation(explain_request())
+
+    assert from_llm
+    assert response.explanation == "留在大厂更合适"
+    assert response.followups == ["要补充评分吗？"]
+    assert tokens > 0
+    assert calls[1]["response_format"]["json_schema"]["schema"]["required"] == ["followups"]
+
+
+def test_structured_mode_charges_usage_when_repair_times_out(monkeypatch, explain_request, mock_llm):
+    def handler(request):
+        if json.loads(request.content).get("stream"):
+            partial = '{"explanation": "留在大厂更合适", "highlights": ["impact"]'
+            usage = "data: " + json.dumps({"choices": [], "usage": {"total_tokens": 30}}) + "\n\n"
+            body = _sse(partial).replace("data: [DONE]", usage + "data: [DONE]")
+            return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+        raise httpx.ReadTimeout("repair stalled")
+
+    mock_llm(handler)
+    monkeypatch.setenv("LLM_STRUCTURED_OUTPUT", "1")
+
+    _, from_llm, tokens = generate_explanation(explain_request())
+
+    assert not from_llm
+    # 流式部分按服务端上报的 30 计，超时的补全调用按 prompt 估算另计
+    assert tokens > 30